@@ -0,0 +1 @@
+# file: mcp_server/__init__.py
@@ -0,0 +1,160 @@
+# file: mcp_server/_auth.py
+"""
+Auth/config helpers shared by the demo (main.py) and the MCP server.
+Importing this module loads the project's .env (without overriding the real environment).
+"""
+from __future__ import annotations
+
+import contextlib
+import functools
+import json
+import logging
+import os
+import tempfile
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+from spotipy.cache_handler import CacheFileHandler
+from spotipy.oauth2 import SpotifyOAuth
+
+load_dotenv: Callable[..., bool] | None
+try:
+    from dotenv import load_dotenv
+except Exception:
+    load_dotenv = None
+
+logger = logging.getLogger(__name__)
+
+# Project root is two levels up from this file
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+if load_dotenv:
+    DOTENV_PATH = PROJECT_ROOT / ".env"
+    if DOTENV_PATH.exists():
+        load_dotenv(dotenv_path=DOTENV_PATH, override=False)
+
+
+def norm_cache_path(raw: str | None, default: Path) -> str:
+    """Expand ~ and env vars; return absolute path as string."""
+    p = Path(os.path.expandvars(os.path.expanduser(raw))) if raw else default
+    # don't require the file to exist; just ensure parent dir exists
+    p = p if p.is_absolute() else (Path.cwd() / p)
+    p.parent.mkdir(parents=True, exist_ok=True)
+    return str(p)
+
+
+def require_env(name: str) -> str:
+    val = os.getenv(name)
+    if not val:
+        raise RuntimeError(f"Missing required environment variable: {name}")
+    return val
+
+
+DEFAULT_SCOPE = os.getenv(
+    "SPOTIFY_SCOPE",
+    "user-top-read user-read-recently-played playlist-modify-private playlist-read-private",
+)
+
+DEFAULT_REDIRECT = os.getenv("SPOTIFY_REDIRECT_URI", "http://127.0.0.1:8888/callback")
+
+# One project-local token cache for the demo and the server, so a login in either is reused
+TOKEN_FILE = norm_cache_path(os.getenv("SPOTIFY_TOKEN_CACHE"),
+                             PROJECT_ROOT / ".spotify-token.json")
+
+
+@functools.lru_cache(maxsize=16)
+def canonical_scope(scope: str) -> str:
+    """Ensure stable, deduped, sorted scopes so we don't 'change' scopes between runs."""
+    parts = [s for s in (scope or "").split() if s.strip()]
+    return " ".join(sorted(set(parts)))
+
+
+class MemoizedCacheHandler(CacheFileHandler):
+    """
+    CacheFileHandler that keeps the parsed token in memory.
+    - get_cached_token only re-reads the file when it changes (e.g. another
+      process refreshed the token). Every writer replaces the file, so a new
+      inode catches writes that a coarse mtime would miss.
+    - A deleted file (how users force a re-login) reads as no token.
+    - save_token_to_cache writes via a temp file + os.replace, so readers
+      never see a half-written token.
+    """
+
+    def __init__(self, cache_path: str | None = None, **kwargs: Any) -> None:
+        super().__init__(cache_path=cache_path, **kwargs)
+        self._token: dict[str, Any] | None = None
+        self._stamp: tuple[int, int] | None = None
+
+    def get_cached_token(self) -> dict[str, Any] | None:
+        try:
+            st = os.stat(self.cache_path)
+        except FileNotFoundError:
+            self._token = self._stamp = None
+            return None
+        except OSError:
+            return self._token
+        stamp = (st.st_ino, st.st_mtime_ns)
+        if stamp != self._stamp:
+            self._token = super().get_cached_token()
+            self._stamp = stamp
+        return self._token
+
+    def save_token_to_cache(self, token_info: dict[str, Any]) -> None:
+        self._token = token_info
+        tmp_path = None
+        try:
+            # Unique name per writer (demo and server may save at once); mkstemp
+            # creates it 0o600 like CacheFileHandler, as it holds the refresh token
+            fd, tmp_path = tempfile.mkstemp(
+                dir=os.path.dirname(self.cache_path) or ".",
+                prefix=f".{os.path.basename(self.cache_path)}.",
+                suffix=".tmp",
+            )
+            with open(fd, "w", encoding="utf-8") as f:
+                f.write(json.dumps(token_info, cls=self.encoder_cls))
+            os.replace(tmp_path, self.cache_path)
+            tmp_path = None
+            st = os.stat(self.cache_path)
+            self._stamp = (st.st_ino, st.st_mtime_ns)
+        except OSError:
+            logger.warning(f"Couldn't write token to cache at: {self.cache_path}")
+        finally:
+            if tmp_path:
+                with contextlib.suppress(OSError):
+                    os.unlink(tmp_path)
+
+
+def create_auth_manager(
+    scope: str,
+    client_id: str,
+    client_secret: str,
+    *,
+    oauth_cls: type[SpotifyOAuth] = SpotifyOAuth,
+    requests_session: Any = True,
+) -> SpotifyOAuth:
+    """
+    Build a SpotifyOAuth backed by the shared, memoized token cache.
+    - Scope is canonicalized so cached tokens keep matching.
+    - Only opens a browser if no cached token exists.
+    """
+    cache_handler = MemoizedCacheHandler(cache_path=TOKEN_FILE)
+    return oauth_cls(
+        client_id=client_id,
+        client_secret=client_secret,
+        redirect_uri=DEFAULT_REDIRECT,
+        scope=canonical_scope(scope),
+        cache_handler=cache_handler,
+        open_browser=not cache_handler.get_cached_token(),  # only for first-time
+        show_dialog=False,
+        requests_session=requests_session,
+    )
+
+
+def seed_token(auth: SpotifyOAuth) -> dict[str, Any] | None:
+    """Eagerly resolve the token once (logging in on first run) and make sure it's saved."""
+    token = auth.validate_token(auth.cache_handler.get_cached_token())
+    token = token or auth.get_access_token(as_dict=True)
+    if token:
+        auth.cache_handler.save_token_to_cache(token)  # force write; belt & suspenders
+    return token
@@ -1,44 +1,54 @@
 # file: mcp_server/spotify_server.py
 from __future__ import annotations
 
+import asyncio
+import contextlib
+import functools
+import inspect
+import itertools
+import json
 import os
+import random
+import sys
+import threading
 import time
-from pathlib import Path
-from typing import Any, Literal
-
-import spotipy
+from collections.abc import AsyncIterator, Callable, Coroutine, Iterable, Iterator
+from types import ModuleType
+from typing import Any, Literal, NoReturn, TypeVar, cast
+
+import anyio
+import httpx
+import requests
+from cachetools import TTLCache
+from mcp.server.fastmcp import Context, FastMCP  # MCP Python SDK (fastmcp)
+from requests.adapters import HTTPAdapter
 from spotipy import SpotifyException
-from spotipy.cache_handler import CacheFileHandler
-from spotipy.oauth2 import SpotifyOAuth
+from spotipy.oauth2 import SpotifyOAuth, SpotifyOauthError
+
+from mcp_server._auth import (
+    DEFAULT_SCOPE,
+    PROJECT_ROOT,
+    TOKEN_FILE,
+    canonical_scope,
+    create_auth_manager,
+    norm_cache_path,
+    require_env,
+    seed_token,
+)
 
+# Optional: faster JSON decoding of API responses (`uv sync --extra fast`)
+orjson: ModuleType | None
 try:
-    from dotenv import load_dotenv
+    import orjson
 except Exception:
-    load_dotenv = None
-
-# Load .env from project root (two levels up from this file)
-if load_dotenv:
-    PROJECT_ROOT = Path(__file__).resolve().parent.parent
-    DOTENV_PATH = PROJECT_ROOT / ".env"
-    if DOTENV_PATH.exists():
-        load_dotenv(dotenv_path=DOTENV_PATH, override=False)
-
-# MCP Python SDK (fastmcp)
-import contextlib
-
-from mcp.server.fastmcp import FastMCP
-
+    orjson = None
 
-# ----------------------------
-# Helper functions (defined before constants that use them)
-# ----------------------------
-def _norm_cache_path(raw: str | None, default: Path) -> str:
-    """Expand ~ and env vars; return absolute path as string."""
-    p = Path(os.path.expandvars(os.path.expanduser(raw))) if raw else default
-    # don't require the file to exist; just ensure parent dir exists
-    p = p if p.is_absolute() else (Path.cwd() / p)
-    p.parent.mkdir(parents=True, exist_ok=True)
-    return str(p)
+# Optional: uvloop event loop for the server (`uv sync --extra fast`; not on Windows)
+uvloop: ModuleType | None
+try:
+    import uvloop
+except Exception:
+    uvloop = None
 
 # ----------------------------
 # Config / constants
@@ -47,102 +57,507 @@ def _norm_cache_path(raw: str | None, default: Path) -> str:
 APP_NAME = "spotify-mcp"
 APP_VERSION = "0.2.0"
 
-DEFAULT_SCOPE = os.getenv(
-    "SPOTIFY_SCOPE",
-    "user-top-read user-read-recently-played playlist-modify-private playlist-read-private",
-)
-
-DEFAULT_REDIRECT = os.getenv("SPOTIFY_REDIRECT_URI", "http://127.0.0.1:8888/callback")
+# Resolved once at import: a misconfigured server fails at startup, not on first tool call
+CLIENT_ID = require_env("SPOTIFY_CLIENT_ID")
+CLIENT_SECRET = require_env("SPOTIFY_CLIENT_SECRET")
 
 # Use normalized paths to ensure ~ expansion and absolute paths
-TOKEN_FILE = _norm_cache_path(os.getenv("SPOTIFY_TOKEN_CACHE"),
-                              PROJECT_ROOT / ".spotify-token.json")
-LOG_FILE = _norm_cache_path(os.getenv("SPOTIFY_MCP_LOG"),
-                            PROJECT_ROOT / ".spotify-mcp.log")
-
-VALID_TIME_RANGES = {"short_term", "medium_term", "long_term"}
+# (the token cache, TOKEN_FILE, is shared with main.py via mcp_server._auth)
+LOG_FILE = norm_cache_path(os.getenv("SPOTIFY_MCP_LOG"), PROJECT_ROOT / ".spotify-mcp.log")
+
+TimeRange = Literal["short_term", "medium_term", "long_term"]
+VALID_TIME_RANGES = frozenset({"short_term", "medium_term", "long_term"})
+
+API_BASE_URL = "https://api.spotify.com"
+PAGE_SIZE = 50  # Spotify's max `limit` for top-items and search
+PAGED_MAX_ITEMS = 500  # cap per get_top_tracks_paged response; callers continue via next_offset
+HTTP_TIMEOUT = 10.0
+ADD_ITEMS_BATCH = 100  # Spotify's max URIs per add-items request (and playlist page size)
+ADD_ITEMS_CONCURRENCY = 5  # add requests in flight across all tool calls
+RESPONSE_CACHE_SIZE = 512
+RESPONSE_CACHE_TTL = 600  # seconds; top tracks / search results rarely change mid-session
+RATE_LIMIT_RPS = 25.0  # roughly Spotify's rolling per-app limit
+RATE_LIMIT_COOLDOWN = 30.0  # seconds after the last 429 before the rate climbs back
+RATE_LIMIT_RAMP = 1.0  # req/s regained per second once the cooldown is over
+RATE_LIMIT_DECREASE_WINDOW = 1.0  # seconds; 429s this close together cut the rate once
+TOKEN_REFRESH_MARGIN = 120  # seconds; spotipy refreshes inline at 60s, so we go first
+RETRY_MAX_ATTEMPTS = 5
+RETRY_BASE_DELAY = 0.25  # seconds; doubles per attempt
+RETRY_MAX_DELAY = 10.0  # seconds; a longer Retry-After is reported to the caller instead
 
 
 # ----------------------------
 # Helpers
 # ----------------------------
-def _require_env(name: str) -> str:
-    val = os.getenv(name)
-    if not val:
-        raise RuntimeError(f"Missing required environment variable: {name}")
-    return val
-
-
 def _log(msg: str) -> None:
     """Log debug messages to project file since Claude often hides server stdout."""
     with contextlib.suppress(Exception), open(LOG_FILE, "a", encoding="utf-8") as f:
         f.write(msg.rstrip() + "\n")
 
 
-def _canonical_scope(scope: str) -> str:
-    """Ensure stable, deduped, sorted scopes so we don't 'change' scopes between runs."""
-    parts = [s for s in (scope or "").split() if s.strip()]
-    return " ".join(sorted(set(parts)))
+_CANON_DEFAULT_SCOPE = canonical_scope(DEFAULT_SCOPE)
+
+
+F = TypeVar("F", bound=Callable[..., Any])
+T = TypeVar("T")
+
+_TRANSIENT_ERRORS = (
+    httpx.TransportError,
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+)
+
+# Failures where the request never reached Spotify, so even a POST is safe to resend
+_CONNECT_ERRORS = (
+    httpx.ConnectError,
+    httpx.ConnectTimeout,
+    httpx.PoolTimeout,
+    requests.exceptions.ConnectTimeout,
+)
+
+
+def _retry_delay(
+    ex: Exception, attempt: int, base: float, *, idempotent: bool = True
+) -> float | None:
+    """
+    Seconds to wait before retrying after `ex`, or None if it isn't retryable.
+    - 429s and connect-phase errors are always retryable.
+    - 5xxs and other transport errors (the request may have been applied) only
+      when `idempotent`.
+    - A Retry-After above RETRY_MAX_DELAY isn't waited out; the error surfaces
+      with its hint instead.
+    """
+    status: Any = None
+    headers: Any = None
+    if isinstance(ex, SpotifyException):
+        status, headers = ex.http_status, ex.headers
+    elif isinstance(ex, SpotifyOauthError):
+        # spotipy raises this from inside `except HTTPError`; the response rides on __context__
+        resp = getattr(ex.__context__, "response", None)
+        if resp is None:
+            return None
+        status, headers = resp.status_code, resp.headers
+    if status is not None:
+        is_5xx = isinstance(status, int) and 500 <= status < 600
+        if status != 429 and not (idempotent and is_5xx):
+            return None
+        retry_after = 0
+        with contextlib.suppress(TypeError, ValueError):
+            retry_after = int((headers or {}).get("Retry-After", 0))
+        if retry_after > RETRY_MAX_DELAY:
+            return None
+    elif isinstance(ex, _CONNECT_ERRORS) or (idempotent and isinstance(ex, _TRANSIENT_ERRORS)):
+        retry_after = 0
+    else:
+        return None
+    # Exponential backoff, never shorter than Retry-After, plus jitter to spread retries
+    return max(retry_after, min(base * 2**attempt, RETRY_MAX_DELAY)) + random.uniform(0, base)
+
+
+def _with_retry(  # noqa: UP047 - requires-python is 3.10, no PEP 695
+    fn: F,
+    *,
+    max_attempts: int = RETRY_MAX_ATTEMPTS,
+    base: float = RETRY_BASE_DELAY,
+    idempotent: bool = True,
+) -> F:
+    """
+    Retry `fn` (sync or async) on 429s, 5xxs and connection errors with jittered backoff.
+    Pass idempotent=False for calls that must not be applied twice (see _retry_delay).
+    """
+    if inspect.iscoroutinefunction(fn):
+
+        @functools.wraps(fn)
+        async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+            attempt = 0
+            while True:
+                try:
+                    return await fn(*args, **kwargs)
+                except Exception as ex:
+                    delay = _retry_delay(ex, attempt, base, idempotent=idempotent)
+                    attempt += 1
+                    if delay is None or attempt >= max_attempts:
+                        raise
+                    _log(f"[retry] {fn.__name__} attempt {attempt} failed ({ex!r}); "
+                         f"sleeping {delay:.2f}s")
+                    await asyncio.sleep(delay)
+
+        return cast(F, async_wrapper)
+
+    @functools.wraps(fn)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        attempt = 0
+        while True:
+            try:
+                return fn(*args, **kwargs)
+            except Exception as ex:
+                delay = _retry_delay(ex, attempt, base, idempotent=idempotent)
+                attempt += 1
+                if delay is None or attempt >= max_attempts:
+                    raise
+                _log(f"[retry] {fn.__name__} attempt {attempt} failed ({ex!r}); "
+                     f"sleeping {delay:.2f}s")
+                time.sleep(delay)
+
+    return cast(F, wrapper)
+
+
+class _RetryingOAuth(SpotifyOAuth):
+    """SpotifyOAuth whose token refresh survives transient failures."""
+
+    @_with_retry
+    def refresh_access_token(self, refresh_token: str) -> dict[str, Any]:
+        return super().refresh_access_token(refresh_token)
+
+
+class TokenBucket:
+    """
+    Client-side rate limiter in front of every Web API call (AIMD).
+    - Up to `capacity` requests may burst; tokens refill at `rate` per second.
+    - penalize() (on a 429) halves the rate, down to 1/s. 429s within
+      `decrease_window` of a cut count as the same event, so a burst of
+      concurrent 429s only cuts once.
+    - After `cooldown` seconds without a 429, the rate climbs back by `ramp`
+      req/s every second until it reaches the full rate.
+    """
+
+    def __init__(
+        self,
+        capacity: float = RATE_LIMIT_RPS,
+        rate: float = RATE_LIMIT_RPS,
+        cooldown: float = RATE_LIMIT_COOLDOWN,
+        ramp: float = RATE_LIMIT_RAMP,
+        decrease_window: float = RATE_LIMIT_DECREASE_WINDOW,
+    ) -> None:
+        self.capacity = capacity
+        self.base_rate = rate
+        self.rate = rate
+        self.cooldown = cooldown
+        self.ramp = ramp
+        self.decrease_window = decrease_window
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._last_cut: float | None = None
+        self._hold_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        if self.rate < self.base_rate and now > self._hold_until:
+            ramp_secs = now - max(self._updated, self._hold_until)
+            self.rate = min(self.base_rate, self.rate + ramp_secs * self.ramp)
+        self._updated = now
+
+    async def acquire(self) -> None:
+        # Waiters queue on the lock, so tokens are handed out in arrival order
+        async with self._lock:
+            self._refill()
+            while self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= 1
+
+    def penalize(self) -> None:
+        self._refill()
+        now = time.monotonic()
+        self._hold_until = now + self.cooldown
+        if self._last_cut is not None and now - self._last_cut < self.decrease_window:
+            return
+        self._last_cut = now
+        self.rate = max(1.0, self.rate / 2)
+        _log(f"[ratelimit] 429 seen; rate now {self.rate:g}/s, "
+             f"climbing back after {self.cooldown:g}s")
+
+
+_json_loads: Callable[[bytes], Any] = orjson.loads if orjson else json.loads
+
+# One pooled, keep-alive session for spotipy (OAuth token exchange/refresh).
+# Retries are handled by _with_retry, not urllib3.
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(pool_connections=10, pool_maxsize=50, max_retries=0))
 
 
 # Global singletons
-_SPOTIFY_CLIENT: spotipy.Spotify | None = None
 _AUTH_MANAGER: SpotifyOAuth | None = None
+_HTTP_CLIENT: httpx.AsyncClient | None = None
+_BACKGROUND_TASKS: set[asyncio.Task[Any]] = set()
+_RATE_LIMITER = TokenBucket()
+_ADD_ITEMS_SEM = asyncio.Semaphore(ADD_ITEMS_CONCURRENCY)
+_USER_ID_TASK: asyncio.Task[str] | None = None
+_INIT_LOCK = threading.Lock()
+_RESPONSE_CACHE: TTLCache[tuple[str, frozenset[tuple[str, Any]]], list[dict[str, Any]]] = TTLCache(
+    maxsize=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL
+)
 
 
-def _spotify(scope: str = DEFAULT_SCOPE) -> spotipy.Spotify:
+@functools.cache
+def _init_auth(scope: str = _CANON_DEFAULT_SCOPE) -> SpotifyOAuth:
     """
-    Get or create a singleton Spotify client.
-    - Uses a project-local file cache so tokens persist between fresh processes.
+    Create the singleton auth manager (idempotent, thread-safe).
+    - Uses a project-local file cache so tokens persist between fresh processes
+      (memoized, so the hot path doesn't re-read it).
     - Only opens a browser if no cache token exists.
     """
-    global _SPOTIFY_CLIENT, _AUTH_MANAGER
+    global _AUTH_MANAGER
+
+    with _INIT_LOCK:
+        if _AUTH_MANAGER is not None:
+            return _AUTH_MANAGER
+
+        _AUTH_MANAGER = create_auth_manager(
+            scope, CLIENT_ID, CLIENT_SECRET, oauth_cls=_RetryingOAuth, requests_session=_SESSION
+        )
+        cached_status = "no" if _AUTH_MANAGER.open_browser else "yes"
+        _log(f"[auth] cache file={TOKEN_FILE} cached={cached_status} "
+             f"scope='{_AUTH_MANAGER.scope}'")
+
+        # Eagerly seed/refresh once and ensure it's saved
+        try:
+            token = seed_token(_AUTH_MANAGER)
+            _log(f"[auth] post-init token={'yes' if token else 'no'}")
+        except Exception as e:
+            _log(f"[auth] token fetch error: {e!r}")
+            raise
 
-    if _SPOTIFY_CLIENT is not None:
-        return _SPOTIFY_CLIENT
+        # Inside the server's event loop, keep the token fresh and resolve the user id
+        # in the background
+        with contextlib.suppress(RuntimeError):
+            asyncio.get_running_loop()
+            _spawn(_token_watchdog())
+            _spawn(_prefetch_user_id())
+        return _AUTH_MANAGER
 
-    client_id = _require_env("SPOTIFY_CLIENT_ID")
-    client_secret = _require_env("SPOTIFY_CLIENT_SECRET")
-    canon_scope = _canonical_scope(scope)
 
-    cache_handler = CacheFileHandler(cache_path=TOKEN_FILE)
-    cached_token = cache_handler.get_cached_token()
-    cached_status = 'yes' if cached_token else 'no'
-    _log(f"[auth] cache file={TOKEN_FILE} cached={cached_status} scope='{canon_scope}'")
+def _auth() -> SpotifyOAuth:
+    """Get the singleton auth manager, creating it on first use."""
+    return _AUTH_MANAGER or _init_auth()
 
-    _AUTH_MANAGER = SpotifyOAuth(
-        client_id=client_id,
-        client_secret=client_secret,
-        redirect_uri=DEFAULT_REDIRECT,
-        scope=canon_scope,
-        cache_handler=cache_handler,
-        open_browser=not bool(cached_token),  # only for first-time
-        show_dialog=False,
+
+async def _token_watchdog() -> None:
+    """
+    Refresh the access token TOKEN_REFRESH_MARGIN seconds before it expires,
+    so tool calls never pay for an inline refresh.
+    - Gives up (falling back to spotipy's inline refresh) if a refresh fails
+      or comes back without all the requested scopes.
+    """
+    assert _AUTH_MANAGER is not None
+    cache_handler = _AUTH_MANAGER.cache_handler
+    while True:
+        token = cache_handler.get_cached_token()
+        if not token or not token.get("refresh_token"):
+            return
+        delay = token["expires_at"] - TOKEN_REFRESH_MARGIN - time.time()
+        if delay > 0:
+            # Re-read afterwards: the token may have been refreshed elsewhere meanwhile
+            await asyncio.sleep(delay)
+            continue
+        try:
+            new_token = await asyncio.to_thread(
+                _AUTH_MANAGER.refresh_access_token, token["refresh_token"]
+            )
+        except Exception as e:
+            _log(f"[auth] background refresh error: {e!r}")
+            return
+        # Same test as spotipy's validate_token: a token missing requested scopes needs
+        # an interactive re-login, which isn't ours to trigger
+        granted = set(canonical_scope(new_token.get("scope", "")).split())
+        if not granted.issuperset(_AUTH_MANAGER.scope.split()):
+            _log("[auth] background refresh lacks requested scopes; leaving refresh to spotipy")
+            return
+        _log(f"[auth] background refresh ok, expires_at={new_token['expires_at']}")
+
+
+def _http() -> httpx.AsyncClient:
+    """
+    Get or create the shared async Web API client.
+    - HTTP/2, so concurrent page requests multiplex over one connection.
+    - Auth is attached per request (see _auth_headers) so token refreshes are picked up.
+    """
+    global _HTTP_CLIENT
+
+    if _HTTP_CLIENT is None:
+        _HTTP_CLIENT = httpx.AsyncClient(
+            base_url=API_BASE_URL, http2=True, timeout=HTTP_TIMEOUT
+        )
+    return _HTTP_CLIENT
+
+
+def _spawn(coro: Coroutine[Any, Any, T]) -> asyncio.Task[T]:  # noqa: UP047
+    """
+    Run `coro` in the background, keeping a reference so it isn't GC'd mid-flight.
+    Tasks still running at shutdown are cancelled by _lifespan.
+    """
+    task = asyncio.get_running_loop().create_task(coro)
+    _BACKGROUND_TASKS.add(task)
+    task.add_done_callback(_BACKGROUND_TASKS.discard)
+    return task
+
+
+async def _prewarm() -> None:
+    """Open the TLS + HTTP/2 connection up front so the first tool call doesn't pay for it."""
+    with contextlib.suppress(httpx.HTTPError):
+        await _http().head("/", timeout=2)
+
+
+async def _auth_headers() -> dict[str, str]:
+    auth = _auth()
+    # Refreshes from the cache/refresh_token when expired. That refresh is a blocking
+    # request (with retry sleeps), so keep it off the event loop.
+    token = await asyncio.to_thread(auth.get_access_token, as_dict=False)
+    return {"Authorization": f"Bearer {token}"}
+
+
+def _raise_for_status(resp: httpx.Response) -> None:
+    """Raise spotipy's SpotifyException on errors, so _handle_spotify_ex can report them."""
+    if resp.is_success:
+        return
+    msg = resp.reason_phrase
+    with contextlib.suppress(Exception):
+        err = resp.json().get("error")
+        msg = err.get("message", msg) if isinstance(err, dict) else (err or msg)
+    raise SpotifyException(
+        resp.status_code, -1, f"{resp.request.url}:\n {msg}", headers=resp.headers
     )
 
-    # Eagerly seed/refresh once and ensure it's saved
+
+async def _request(
+    method: str,
+    path: str,
+    *,
+    params: dict[str, Any] | None = None,
+    json: Any = None,
+) -> dict[str, Any]:
+    """Issue one Web API request and return the decoded JSON body ({} when empty)."""
+    headers = await _auth_headers()
+    await _RATE_LIMITER.acquire()
+    resp = await _http().request(method, path, params=params, json=json, headers=headers)
+    if resp.status_code == 429:
+        _RATE_LIMITER.penalize()
+    _raise_for_status(resp)
+    return _json_loads(resp.content) if resp.content else {}
+
+
+_retrying_request = _with_retry(_request)
+_retrying_unsafe_request = _with_retry(_request, idempotent=False)
+
+
+async def _api(
+    method: str,
+    path: str,
+    *,
+    params: dict[str, Any] | None = None,
+    json: Any = None,
+) -> dict[str, Any]:
+    """
+    _request with retries. Writes (non-GET/HEAD) are only resent on 429s and
+    connect-phase errors, so a POST that may have landed isn't applied twice.
+    """
+    send = _retrying_request if method in ("GET", "HEAD") else _retrying_unsafe_request
+    return await send(method, path, params=params, json=json)
+
+
+async def _fetch_user_id() -> str:
+    return (await _api("GET", "/v1/me"))["id"]
+
+
+async def _user_id(*, refresh: bool = False) -> str:
+    """
+    Current user's id; it never changes for a login, so fetch it once per process.
+    - Concurrent callers share the one in-flight fetch.
+    - A failed or cancelled fetch (or refresh=True) starts a new one.
+    """
+    global _USER_ID_TASK
+
+    task = _USER_ID_TASK
+    if (
+        task is None
+        or refresh
+        or (task.done() and (task.cancelled() or task.exception() is not None))
+    ):
+        task = _USER_ID_TASK = _spawn(_fetch_user_id())
+    # shield: one caller being cancelled mustn't cancel the fetch the others await
+    return await asyncio.shield(task)
+
+
+async def _prefetch_user_id() -> None:
     try:
-        token = _AUTH_MANAGER.get_cached_token() or _AUTH_MANAGER.get_access_token(as_dict=True)
-        if token:
-            try:
-                cache_handler.save_token_to_cache(token)  # force write; belt & suspenders
-            except Exception as e:
-                _log(f"[auth] save_token_to_cache error: {e!r}")
-        _log(f"[auth] post-init token={'yes' if token else 'no'}")
+        await _user_id()
     except Exception as e:
-        _log(f"[auth] token fetch error: {e!r}")
+        _log(f"[auth] user id prefetch error: {e!r}")
+
+
+async def _cached_get(
+    path: str,
+    params: dict[str, Any],
+    shape: Callable[[dict[str, Any]], list[dict[str, Any]]],
+    *,
+    refresh: bool = False,
+) -> list[dict[str, Any]]:
+    """
+    GET an idempotent endpoint through the in-process TTL cache.
+    - Only the shaped rows are cached, not the full (much larger) response.
+    - refresh=True bypasses (and repopulates) the cached entry.
+    - A 401 means the token changed under us, so everything cached is dropped.
+    """
+    key = (path, frozenset(params.items()))
+    if not refresh and key in _RESPONSE_CACHE:
+        return _RESPONSE_CACHE[key]
+    try:
+        resp = await _api("GET", path, params=params)
+    except SpotifyException as ex:
+        if ex.http_status == 401:
+            _RESPONSE_CACHE.clear()
         raise
+    rows = _RESPONSE_CACHE[key] = shape(resp)
+    return rows
 
-    _SPOTIFY_CLIENT = spotipy.Spotify(auth_manager=_AUTH_MANAGER)
-    return _SPOTIFY_CLIENT
+
+async def _add_items(playlist_id: str, uris: list[str]) -> int:
+    """
+    Add URIs to a playlist in 100-item batches, sent in the JSON body.
+    - Duplicate URIs are dropped (first occurrence wins); returns the number added.
+    - A playlist's batches go out one after another, so the caller's order is kept
+      (Spotify serializes writes to one playlist anyway). _ADD_ITEMS_SEM bounds
+      concurrent add requests across tool calls.
+    """
+    path = f"/v1/playlists/{playlist_id}/tracks"
+    added = 0
+    for chunk in _chunked(dict.fromkeys(uris), ADD_ITEMS_BATCH):  # order-preserving dedupe
+        async with _ADD_ITEMS_SEM:
+            await _api("POST", path, json={"uris": chunk})
+        added += len(chunk)
+    return added
+
+
+async def _playlist_uris(playlist_id: str) -> set[str | None]:
+    """URIs already in a playlist; pages after the first are fetched concurrently."""
+    path = f"/v1/playlists/{playlist_id}/tracks"
+
+    def page(offset: int) -> Coroutine[Any, Any, dict[str, Any]]:
+        params = {"fields": "items(track(uri)),total", "limit": ADD_ITEMS_BATCH, "offset": offset}
+        return _api("GET", path, params=params)
+
+    first = await page(0)
+    rest = await asyncio.gather(
+        *(page(o) for o in range(ADD_ITEMS_BATCH, first.get("total") or 0, ADD_ITEMS_BATCH))
+    )
+    return {
+        (item.get("track") or _EMPTY).get("uri")
+        for p in (first, *rest)
+        for item in p.get("items") or ()
+    }
 
 
-def _chunked(seq: list[str], size: int = 100):
-    for i in range(0, len(seq), size):
-        yield seq[i : i + size]
+def _chunked(seq: Iterable[str], size: int = 100) -> Iterator[list[str]]:
+    it = iter(seq)
+    return iter(lambda: list(itertools.islice(it, size)), [])
 
 
 def _safe_limit(limit: int, default: int = 10) -> int:
+    # FastMCP has already validated the int annotation, so this is the common case
+    if type(limit) is int:
+        return max(1, min(50, limit))
     try:
         n = int(limit)
     except Exception:
@@ -150,22 +565,44 @@ def _safe_limit(limit: int, default: int = 10) -> int:
     return max(1, min(50, n))
 
 
-def _validate_time_range(time_range: str) -> str:
-    return time_range if time_range in VALID_TIME_RANGES else "short_term"
+def _validate_time_range(time_range: str) -> TimeRange:
+    return cast(TimeRange, time_range) if time_range in VALID_TIME_RANGES else "short_term"
+
+
+_NO_ARTISTS: tuple[dict[str, Any], ...] = ({},)
+_EMPTY: dict[str, Any] = {}
+
+
+def _track_summary(t: dict[str, Any]) -> dict[str, Any]:
+    # id/uri/name are always present on track objects (id is null for local files)
+    return {
+        "id": t["id"],
+        "uri": t["uri"],
+        "name": t["name"],
+        "artist": (t.get("artists") or _NO_ARTISTS)[0].get("name"),
+        "album": (t.get("album") or _EMPTY).get("name"),
+    }
+
+
+def _top_tracks_rows(resp: dict[str, Any]) -> list[dict[str, Any]]:
+    return list(map(_track_summary, resp.get("items") or ()))
 
 
-def _handle_spotify_ex(ex: SpotifyException) -> None:
+def _search_rows(resp: dict[str, Any]) -> list[dict[str, Any]]:
+    return list(map(_track_summary, (resp.get("tracks") or _EMPTY).get("items") or ()))
+
+
+def _handle_spotify_ex(ex: SpotifyException) -> NoReturn:
     # Surface a concise, actionable error via MCP
+    # (429s and 5xxs have already been retried with backoff by _with_retry)
     status = getattr(ex, "http_status", None)
     headers = getattr(ex, "headers", {}) or {}
     retry_after = headers.get("Retry-After")
     msg = getattr(ex, "msg", str(ex))
 
-    if status == 429 and retry_after:
-        # Back off briefly before raising, so agent retries succeed without immediate failure
-        with contextlib.suppress(Exception):
-            time.sleep(int(retry_after))
-        raise RuntimeError(f"Rate limited by Spotify (429). Suggested retry after {retry_after}s.")
+    if status == 429:
+        hint = f" Suggested retry after {retry_after}s." if retry_after else ""
+        raise RuntimeError(f"Rate limited by Spotify (429).{hint}")
     elif status in (401, 403):
         raise RuntimeError(
             f"Spotify auth/permission error ({status}). Check scopes and login: {msg}"
@@ -177,14 +614,30 @@ def _handle_spotify_ex(ex: SpotifyException) -> None:
 # ----------------------------
 # MCP app & tools
 # ----------------------------
-app = FastMCP(APP_NAME)
+@contextlib.asynccontextmanager
+async def _lifespan(_server: FastMCP) -> AsyncIterator[None]:
+    global _HTTP_CLIENT
+
+    _spawn(_prewarm())
+    try:
+        yield
+    finally:
+        for task in list(_BACKGROUND_TASKS):
+            task.cancel()
+        if _HTTP_CLIENT is not None:
+            await _HTTP_CLIENT.aclose()
+            _HTTP_CLIENT = None
+
+
+app = FastMCP(APP_NAME, lifespan=_lifespan)
 
 
 @app.tool()
-def get_top_tracks(
+async def get_top_tracks(
     limit: int = 10,
     time_range: Literal["short_term", "medium_term", "long_term"] = "short_term",
     offset: int = 0,
+    refresh: bool = False,
 ) -> list[dict[str, Any]]:
     """
     Return the current user's top tracks (paged).
@@ -192,58 +645,104 @@ def get_top_tracks(
       limit: 1-50
       time_range: 'short_term' (4 weeks), 'medium_term' (6 months), 'long_term' (years)
       offset: pagination offset (multiple of limit)
+      refresh: bypass the 10-minute response cache
     """
-    sp = _spotify()
     limit = _safe_limit(limit)
     time_range = _validate_time_range(time_range)
     try:
-        resp = sp.current_user_top_tracks(limit=limit, time_range=time_range, offset=offset)
+        return await _cached_get(
+            "/v1/me/top/tracks",
+            {"limit": limit, "time_range": time_range, "offset": offset},
+            _top_tracks_rows,
+            refresh=refresh,
+        )
     except SpotifyException as ex:
         _handle_spotify_ex(ex)
 
-    out: list[dict[str, Any]] = []
-    for t in resp.get("items", []) or []:
-        out.append(
-            {
-                "id": t.get("id"),
-                "uri": t.get("uri"),
-                "name": t.get("name"),
-                "artist": (t.get("artists") or [{}])[0].get("name"),
-                "album": (t.get("album") or {}).get("name"),
-            }
+
+@app.tool()
+async def get_top_tracks_paged(
+    total: int = 200,
+    time_range: Literal["short_term", "medium_term", "long_term"] = "short_term",
+    offset: int = 0,
+    refresh: bool = False,
+    ctx: Context | None = None,
+) -> dict[str, Any]:
+    """
+    Return up to `total` (max 500) of the current user's top tracks, starting at `offset`.
+    - Pages of 50 are requested concurrently, so this costs about one round trip;
+      progress is reported as each page lands.
+    - `next_offset` is the offset for the following call, or null when there are no more.
+    - Pass refresh=True to bypass the response cache.
+    Returns: {items, next_offset}
+    """
+    total = max(1, min(PAGED_MAX_ITEMS, int(total)))
+    offset = max(0, int(offset))
+    time_range = _validate_time_range(time_range)
+    tasks = [
+        asyncio.ensure_future(
+            _cached_get(
+                "/v1/me/top/tracks",
+                {
+                    "limit": min(PAGE_SIZE, total - o),
+                    "time_range": time_range,
+                    "offset": offset + o,
+                },
+                _top_tracks_rows,
+                refresh=refresh,
+            )
         )
-    return out
+        for o in range(0, total, PAGE_SIZE)
+    ]
+    try:
+        for done, fut in enumerate(asyncio.as_completed(tasks), start=1):
+            await fut
+            if ctx is not None:
+                await ctx.report_progress(done, len(tasks))
+    except SpotifyException as ex:
+        _handle_spotify_ex(ex)
+    finally:
+        for t in tasks:
+            t.cancel()  # no-op for pages that already finished
+        # Reap the rest so a sibling's failure isn't logged as "never retrieved"
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    items = [t for task in tasks for t in task.result()]
+    return {
+        "items": items,
+        "next_offset": offset + len(items) if len(items) == total else None,
+    }
 
 
 @app.tool()
-def search_tracks(query: str, limit: int = 5, offset: int = 0) -> list[dict[str, Any]]:
-    """Search for tracks by text query. Returns simplified track metadata."""
+async def search_tracks(
+    query: str, limit: int = 5, offset: int = 0, refresh: bool = False
+) -> list[dict[str, Any]]:
+    """
+    Search for tracks by text query. Returns simplified track metadata.
+    - Results are limited to tracks playable in the user's country; where Spotify
+      relinks a track, the returned id/uri is the playable version.
+    - Results are cached for 10 minutes; pass refresh=True to bypass.
+    """
     if not query or not query.strip():
         raise ValueError("query is required")
-    sp = _spotify()
     limit = _safe_limit(limit)
     try:
-        resp = sp.search(q=query, type="track", limit=limit, offset=offset)
+        return await _cached_get(
+            "/v1/search",
+            # from_token: only tracks playable in the user's market, relinked where needed;
+            # it also drops the per-track available_markets arrays, most of the payload
+            {"q": query, "type": "track", "limit": limit, "offset": offset,
+             "market": "from_token"},
+            _search_rows,
+            refresh=refresh,
+        )
     except SpotifyException as ex:
         _handle_spotify_ex(ex)
 
-    items = (resp.get("tracks") or {}).get("items", []) or []
-    results: list[dict[str, Any]] = []
-    for t in items:
-        results.append(
-            {
-                "id": t.get("id"),
-                "uri": t.get("uri"),
-                "name": t.get("name"),
-                "artist": (t.get("artists") or [{}])[0].get("name"),
-                "album": (t.get("album") or {}).get("name"),
-            }
-        )
-    return results
-
 
 @app.tool()
-def create_playlist(
+async def create_playlist(
     name: str,
     description: str = "",
     public: bool = False,
@@ -255,15 +754,17 @@ def create_playlist(
     """
     if not name or not name.strip():
         raise ValueError("name is required")
-    sp = _spotify()
+    body = {"name": name, "public": public, "description": description}
     try:
-        me = sp.me()
-        playlist = sp.user_playlist_create(me["id"], name, public=public, description=description)
-        added = 0
-        if track_uris:
-            for chunk in _chunked(track_uris, 100):
-                sp.playlist_add_items(playlist["id"], chunk)
-                added += len(chunk)
+        try:
+            playlist = await _api("POST", f"/v1/users/{await _user_id()}/playlists", json=body)
+        except SpotifyException as ex:
+            if ex.http_status not in (401, 403):
+                raise
+            # The cached id may belong to a previous login; re-resolve it once
+            user_id = await _user_id(refresh=True)
+            playlist = await _api("POST", f"/v1/users/{user_id}/playlists", json=body)
+        added = await _add_items(playlist["id"], track_uris) if track_uris else 0
     except SpotifyException as ex:
         _handle_spotify_ex(ex)
 
@@ -271,19 +772,23 @@ def create_playlist(
 
 
 @app.tool()
-def add_tracks_to_playlist(playlist_id: str, uris: list[str]) -> dict[str, Any]:
-    """Add track URIs to an existing playlist (chunked)."""
+async def add_tracks_to_playlist(
+    playlist_id: str, uris: list[str], skip_existing: bool = False
+) -> dict[str, Any]:
+    """
+    Add track URIs to an existing playlist (chunked, duplicates dropped).
+    With skip_existing=True, URIs already in the playlist are not added again.
+    """
     if not playlist_id:
         raise ValueError("playlist_id is required")
     if not uris:
         return {"playlist_id": playlist_id, "tracks_added": 0}
 
-    sp = _spotify()
-    total = 0
     try:
-        for chunk in _chunked(uris, 100):
-            sp.playlist_add_items(playlist_id, chunk)
-            total += len(chunk)
+        if skip_existing:
+            existing = await _playlist_uris(playlist_id)
+            uris = [u for u in uris if u not in existing]
+        total = await _add_items(playlist_id, uris) if uris else 0
     except SpotifyException as ex:
         _handle_spotify_ex(ex)
 
@@ -291,7 +796,11 @@ def add_tracks_to_playlist(playlist_id: str, uris: list[str]) -> dict[str, Any]:
 
 
 def main() -> None:
-    app.run()  # stdio transport (FastMCP default)
+    if uvloop is not None and sys.platform != "win32":
+        # Same as app.run()'s stdio transport, on a uvloop event loop
+        anyio.run(app.run_stdio_async, backend_options={"use_uvloop": True})
+    else:
+        app.run()  # stdio transport (FastMCP default)
 
 
 if __name__ == "__main__":